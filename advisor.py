@@ -34,12 +34,12 @@ Please provide:
 Keep the tone conversational and supportive. Focus on practical, achievable steps."""
         )
 
-    def generate_advice(self, monthly_income, transactions_df, risk_level):
+    def generate_advice(self, monthly_income, transactions_df, risk_level, raise_errors=False):
         if transactions_df.empty:
             return "Please upload transaction data to receive personalized financial advice."
 
         total_expenses = transactions_df['amount'].sum()
-        category_totals = transactions_df.groupby('category')['amount'].sum()
+        category_totals = transactions_df.groupby('category', observed=True)['amount'].sum()
         category_percentages = (category_totals / total_expenses * 100).round(1)
 
         category_breakdown = "\n".join([
@@ -66,14 +66,17 @@ Keep the tone conversational and supportive. Focus on practical, achievable step
             )
             return response.choices[0].message.content
         except Exception as e:
+            # Background jobs re-raise so the queue retries instead of storing the error as advice
+            if raise_errors:
+                raise
             return f"Unable to generate advice at this time. Error: {str(e)}"
 
-    def get_spending_insights(self, transactions_df):
+    def get_spending_insights(self, transactions_df, subscriptions=None):
         if transactions_df.empty:
             return []
 
         insights = []
-        category_stats = transactions_df.groupby('category').agg({
+        category_stats = transactions_df.groupby('category', observed=True).agg({
             'amount': ['sum', 'count', 'mean']
         }).round(2)
 
@@ -88,6 +91,13 @@ Keep the tone conversational and supportive. Focus on practical, achievable step
         avg_transaction = transactions_df['amount'].mean()
         insights.append(f"Average transaction amount: ${avg_transaction:.2f}")
 
+        if subscriptions is not None and not subscriptions.empty:
+            monthly_cost = subscriptions['monthly_cost'].sum()
+            top = ", ".join(subscriptions['merchant'].head(3))
+            insights.append(
+                f"Recurring charges: {len(subscriptions)} subscriptions costing about ${monthly_cost:.2f}/month (largest: {top})"
+            )
+
         return insights
 
     def financial_chatbot(self):
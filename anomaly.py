@@ -0,0 +1,125 @@
+import pandas as pd
+import math
+
+from merchants import normalize_merchant
+
+
+class AnomalyDetector:
+    def __init__(self, db, z_threshold=3.0, ewma_alpha=0.1, ewma_ratio=3.0, new_merchant_ratio=3.0, min_history=5,
+                 min_log_std=0.1):
+        self.db = db
+        self.z_threshold = z_threshold
+        self.ewma_alpha = ewma_alpha
+        self.ewma_ratio = ewma_ratio
+        self.new_merchant_ratio = new_merchant_ratio
+        self.min_history = min_history
+        # Floor on a merchant's log-amount spread, so a small price change on a fixed subscription is not an outlier
+        self.min_log_std = min_log_std
+
+    def check(self, category_stats, merchant_stats, merchant_key, category, amount):
+        # Statistics are kept on log-amounts, which are far closer to normal than raw spend
+        log_amount = math.log1p(max(amount, 0.0))
+
+        # A merchant with enough history is judged against its own charges, so a pricey but
+        # regular merchant (a yearly flight) is not flagged for being unusual in its category
+        merchant_n, merchant_mean, merchant_m2 = merchant_stats.get(merchant_key, (0, 0.0, 0.0))
+        if merchant_n >= self.min_history:
+            std = max(math.sqrt(merchant_m2 / (merchant_n - 1)), self.min_log_std)
+            z_score = (log_amount - merchant_mean) / std
+            if z_score > self.z_threshold and log_amount - merchant_mean > math.log(self.ewma_ratio):
+                return [
+                    f"{math.expm1(log_amount) / math.expm1(merchant_mean):.1f}x the usual charge at this merchant "
+                    f"({z_score:.1f} standard deviations above usual)"
+                ]
+            return []
+
+        n, mean, m2, ewma = category_stats.get(category, (0, 0.0, 0.0, 0.0))
+        if n < self.min_history:
+            return []
+
+        std = math.sqrt(m2 / (n - 1))
+        z_score = (log_amount - mean) / std if std > 0 else 0.0
+        recent_ratio = log_amount - ewma
+
+        # Until its own history is long enough, a returning merchant must also beat its earlier charges
+        merchant_ratio = log_amount - merchant_mean if merchant_n else math.inf
+
+        reasons = []
+        if z_score > self.z_threshold and min(recent_ratio, merchant_ratio) > math.log(self.ewma_ratio):
+            reasons.append(
+                f"{math.expm1(log_amount) / math.expm1(ewma):.1f}x the recent {category} average "
+                f"({z_score:.1f} standard deviations above usual)"
+            )
+        if merchant_n == 0 and log_amount - mean > math.log(self.new_merchant_ratio):
+            reasons.append("Large first charge from a new merchant")
+        return reasons
+
+    def update(self, category_stats, merchant_stats, merchant_key, category, amount):
+        # Welford running mean/variance plus an exponentially weighted mean, all of log-amount
+        n, mean, m2, ewma = category_stats.get(category, (0, 0.0, 0.0, 0.0))
+        log_amount = math.log1p(max(amount, 0.0))
+        n += 1
+        delta = log_amount - mean
+        mean += delta / n
+        m2 += delta * (log_amount - mean)
+        ewma = log_amount if n == 1 else self.ewma_alpha * log_amount + (1 - self.ewma_alpha) * ewma
+        category_stats[category] = (n, mean, m2, ewma)
+
+        # The same Welford update per merchant, which does not depend on the category rules
+        merchant_n, merchant_mean, merchant_m2 = merchant_stats.get(merchant_key, (0, 0.0, 0.0))
+        merchant_n += 1
+        delta = log_amount - merchant_mean
+        merchant_mean += delta / merchant_n
+        merchant_m2 += delta * (log_amount - merchant_mean)
+        merchant_stats[merchant_key] = (merchant_n, merchant_mean, merchant_m2)
+
+    def rebuild_category_stats(self, user_id, conn):
+        # Recompute per-category statistics in SQL after transactions change category.
+        # The EWMA restarts at the long-run mean since row order is not replayed.
+        conn.create_function('log1p', 1, lambda amount: math.log1p(max(amount or 0.0, 0.0)), deterministic=True)
+        conn.execute("DELETE FROM category_stats WHERE user_id = ?", (user_id,))
+        conn.execute(
+            '''INSERT INTO category_stats (user_id, category, n, mean, m2, ewma)
+            SELECT user_id, category, COUNT(*), AVG(l), MAX(SUM(l * l) - COUNT(*) * AVG(l) * AVG(l), 0), AVG(l)
+            FROM (SELECT user_id, category, log1p(amount) AS l FROM transactions WHERE user_id = ?)
+            GROUP BY category''',
+            (user_id,)
+        )
+
+    def ingest(self, user_id, transactions_df, conn=None):
+        own_connection = conn is None
+        if own_connection:
+            conn = self.db.get_connection()
+
+        category_stats, merchant_stats = self.db.get_anomaly_stats(user_id, conn)
+        touched_categories = set()
+        touched_merchants = set()
+
+        flags = []
+        ordered = transactions_df.sort_values('date', kind='stable')
+        for row in ordered[['date', 'amount', 'merchant', 'category']].itertuples(index=False):
+            merchant_key = normalize_merchant(row.merchant)
+            amount = float(row.amount)
+            reasons = self.check(category_stats, merchant_stats, merchant_key, row.category, amount)
+            if reasons:
+                flags.append((user_id, str(row.date), row.merchant, row.category, amount, '; '.join(reasons)))
+            self.update(category_stats, merchant_stats, merchant_key, row.category, amount)
+            touched_categories.add(row.category)
+            touched_merchants.add(merchant_key)
+
+        self.db.save_anomaly_stats(
+            user_id,
+            {category: category_stats[category] for category in touched_categories},
+            {merchant_key: merchant_stats[merchant_key] for merchant_key in touched_merchants},
+            flags,
+            conn
+        )
+
+        if own_connection:
+            conn.commit()
+            conn.close()
+
+        return pd.DataFrame(
+            [flag[1:] for flag in flags],
+            columns=['date', 'merchant', 'category', 'amount', 'reason']
+        )
@@ -6,14 +6,24 @@ from streamlit_option_menu import option_menu
 import pandas as pd
 from datetime import datetime
 import plotly.express as px
+import json
 import os
+import time
 
 
-from database import Database
+from database import Database, TransactionFrameCache
 from portfolio import PortfolioAnalyzer
 from transactions import TransactionClassifier
 from risk import RiskAnalyzer
 from advisor import BudgetAdvisor
+from projection import SavingsProjector
+from recurring import RecurringDetector
+from anomaly import AnomalyDetector
+from categories import CategoryRules
+from figures import FigureCache
+from worker import WorkerClient
+from jobqueue import JobQueue, JobWorkerPool, make_handlers
+from payloads import fingerprint
 
 
 
@@ -23,6 +33,74 @@ portfolio_analyzer = PortfolioAnalyzer(db)
 transaction_classifier = TransactionClassifier(db)
 risk_analyzer = RiskAnalyzer(db)
 budget_advisor = BudgetAdvisor(db)
+savings_projector = SavingsProjector(db)
+recurring_detector = RecurringDetector(db)
+anomaly_detector = AnomalyDetector(db)
+category_rules = CategoryRules(db)
+figure_cache = FigureCache(db)
+
+# Optional split mode: heavy jobs run in a separate worker service (python worker.py)
+worker_client = WorkerClient(os.getenv("WORKER_URL")) if os.getenv("WORKER_URL") else None
+
+
+def calculate_risk(user_id, monthly_income):
+    if worker_client:
+        return worker_client.calculate_risk(user_id, monthly_income)
+
+    transactions_df = db.load_transactions_frame(user_id)
+    risk_analysis = risk_analyzer.calculate_risk_level(monthly_income, transactions_df)
+    # Project savings forward from historical spending
+    risk_analysis['projection'] = savings_projector.project(
+        monthly_income,
+        transactions_df,
+        risk_analysis['savings_buffer'],
+        seed_key=user_id
+    )
+    return risk_analysis
+
+
+# Background workers outlive script reruns; jobs themselves live in the database
+@st.cache_resource(show_spinner=False)
+def start_job_workers():
+    queue = JobQueue(db)
+    handlers = make_handlers(
+        queue,
+        db,
+        worker_client.process_transactions if worker_client else transaction_classifier.process_transactions,
+        calculate_risk,
+        budget_advisor,
+        anomaly_detector,
+        recurring_detector,
+        category_rules
+    )
+    JobWorkerPool(queue, handlers).start()
+    return queue
+
+
+poll_jobs = False
+
+
+def job_result(job):
+    # Returns the result of a finished job, otherwise shows its status
+    global poll_jobs
+    if job['state'] == 'done':
+        return json.loads(job['result'])
+    if job['state'] == 'failed':
+        st.error(f"Job failed after {job['attempts']} attempts: {job['error'].strip().splitlines()[-1]}")
+        if st.button("Retry", key=f"retry_{job['id']}"):
+            job_queue.retry(job['id'])
+            st.rerun()
+        return None
+    st.progress(job['progress'], text=job['message'] or "Waiting in queue...")
+    poll_jobs = True
+    return None
+
+
+def rerun_while_pending():
+    # Poll the queue by rerunning the script while a job is still in flight
+    if poll_jobs:
+        time.sleep(1)
+        st.rerun()
 
 # Page config
 st.set_page_config(
@@ -31,6 +109,9 @@ st.set_page_config(
     layout="wide"
 )
 
+# Started after set_page_config, which must be the first Streamlit command
+job_queue = start_job_workers()
+
 # Sidebar navigation
 with st.sidebar:
     st.title("Financial Copilot")
@@ -47,6 +128,8 @@ if 'user_id' not in st.session_state:
     st.session_state.user_id = None
 if 'monthly_income' not in st.session_state:
     st.session_state.monthly_income = None
+if 'transaction_cache' not in st.session_state:
+    st.session_state.transaction_cache = TransactionFrameCache(db)
 
 # Home page
 if selected == "Home":
@@ -91,7 +174,13 @@ elif selected == "Portfolio":
         # Display portfolio
         portfolio_df = db.get_user_portfolio(st.session_state.user_id)
         if not portfolio_df.empty:
-            portfolio_value = portfolio_analyzer.calculate_portfolio_value(portfolio_df)
+            # Price histories fetched while valuing the portfolio are reused by the trend chart
+            histories = None
+            if worker_client:
+                portfolio_value = worker_client.calculate_portfolio_value(st.session_state.user_id)
+            else:
+                histories = {}
+                portfolio_value = portfolio_analyzer.calculate_portfolio_value(portfolio_df, histories)
             summary = portfolio_analyzer.get_portfolio_summary(portfolio_value)
             
             # Display summary metrics
@@ -106,11 +195,20 @@ elif selected == "Portfolio":
                 st.metric("Return", f"{summary['total_gain_loss_pct']:.1f}%")
             
             # Display charts
+            # Both charts are rebuilt when holdings change, and at most hourly for new prices
+            portfolio_version = db.get_portfolio_version(st.session_state.user_id)
+            hour = datetime.now().strftime('%Y-%m-%d %H')
             col1, col2 = st.columns(2)
             with col1:
-                st.plotly_chart(portfolio_analyzer.plot_portfolio_allocation(portfolio_value))
+                st.plotly_chart(figure_cache.get(
+                    ('allocation', st.session_state.user_id, portfolio_version, hour),
+                    lambda: portfolio_analyzer.plot_portfolio_allocation(portfolio_value)
+                ))
             with col2:
-                st.plotly_chart(portfolio_analyzer.plot_price_trends(portfolio_df))
+                st.plotly_chart(figure_cache.get(
+                    ('price_trends', st.session_state.user_id, portfolio_version, hour),
+                    lambda: portfolio_analyzer.plot_price_trends(portfolio_df, histories=histories)
+                ))
             
             # Display detailed portfolio table
             st.subheader("Portfolio Details")
@@ -125,22 +223,60 @@ elif selected == "Transactions":
     if not st.session_state.user_id:
         st.warning("Please complete registration on the Home page first.")
     else:
+        # Category rules editor; saving creates a new rule version
+        with st.expander("Category Rules"):
+            rule_version, patterns = category_rules.active()
+            rules_text = st.text_area(
+                f"One 'Category: pattern' per line, first match wins (version {rule_version})",
+                "\n".join(f"{category}: {pattern}" for category, pattern in patterns.items()),
+                height=260,
+                help="Patterns are regular expressions searched in the merchant name as uploaded, lowercased (e.g. 'at&t', '7-eleven')"
+            )
+            if st.button("Save Rules"):
+                new_patterns = dict(
+                    (part.strip() for part in line.split(':', 1))
+                    for line in rules_text.splitlines()
+                    if ':' in line
+                )
+                if new_patterns != patterns:
+                    try:
+                        # Only transactions whose merchant changes category are rewritten
+                        new_version = category_rules.save(new_patterns, recategorize=False)
+                        job_queue.enqueue('recategorize', None, {}, fingerprint('recategorize', new_version))
+                        st.success(f"Saved rules version {new_version}. Re-categorizing in the background.")
+                    except ValueError as e:
+                        st.error(str(e))
+        
         # File upload
         uploaded_file = st.file_uploader("Upload Transaction CSV", type=['csv'])
         
         if uploaded_file is not None:
             try:
-                transactions_df = pd.read_csv(uploaded_file)
-                processed_df = transaction_classifier.process_transactions(transactions_df)
-                
-                # Save to database
-                db.save_transactions(st.session_state.user_id, processed_df)
+                # Classify and save in the background; re-uploading the same file reuses the job
+                data = uploaded_file.getvalue()
+                job_id = job_queue.enqueue(
+                    'upload',
+                    st.session_state.user_id,
+                    {'csv': data.decode('utf-8')},
+                    fingerprint('upload', st.session_state.user_id, data)
+                )
+                result = job_result(job_queue.get(job_id))
+                if result is None:
+                    rerun_while_pending()
+                    st.stop()
+
+                processed_df = db.load_transactions_frame(st.session_state.user_id, result['row_ids'])
+                if result['flags']:
+                    st.warning(f"{result['flags']} unusual transactions flagged. See the Risk page for details.")
                 
                 # Display results
                 st.subheader("Transaction Analysis")
                 
                 # Display spending breakdown chart
-                st.plotly_chart(transaction_classifier.plot_spending_breakdown(processed_df))
+                st.plotly_chart(figure_cache.get(
+                    ('spending', job_id),
+                    lambda: transaction_classifier.plot_spending_breakdown(processed_df)
+                ))
                 
                 # Display category summary
                 st.subheader("Category Summary")
@@ -161,13 +297,25 @@ elif selected == "Risk":
     if not st.session_state.user_id:
         st.warning("Please complete registration on the Home page first.")
     else:
-        transactions_df = db.get_user_transactions(st.session_state.user_id)
+        transactions_df = st.session_state.transaction_cache.get(st.session_state.user_id)
         
         if not transactions_df.empty:
-            risk_analysis = risk_analyzer.calculate_risk_level(
-                st.session_state.monthly_income,
-                transactions_df
+            # Scored (and saved) once per data version in the background
+            job_id = job_queue.enqueue(
+                'risk',
+                st.session_state.user_id,
+                {'monthly_income': st.session_state.monthly_income},
+                fingerprint(
+                    'risk',
+                    st.session_state.user_id,
+                    db.get_data_version(st.session_state.user_id),
+                    st.session_state.monthly_income
+                )
             )
+            risk_analysis = job_result(job_queue.get(job_id))
+            if risk_analysis is None:
+                rerun_while_pending()
+                st.stop()
             
             # Display risk level
             st.subheader("Risk Assessment")
@@ -181,18 +329,36 @@ elif selected == "Risk":
             # Display reason
             st.write("**Analysis:**", risk_analysis['reason'])
             
+            projection = risk_analysis['projection']
+            if projection:
+                st.subheader(f"Savings Outlook ({projection['horizon_months']} months)")
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric(
+                        "Funded Buffer Depletion Risk",
+                        f"{projection['depletion_probability']:.1%}",
+                        help=f"Chance that a ${projection.get('funded_balance', projection['target_buffer']):,.0f} emergency fund runs out at current spending"
+                    )
+                with col2:
+                    st.metric("Chance to Reach Target", f"{projection['target_probability']:.1%}")
+                with col3:
+                    months = projection['months_to_target_median']
+                    if months is None or projection['target_probability'] < 0.5:
+                        st.metric("Months to Target", f"> {projection['horizon_months']}")
+                    else:
+                        st.metric("Months to Target", f"{months:.0f}", help="Median over all simulated paths")
+            
+            # Display flagged transactions
+            flags = db.get_transaction_flags(st.session_state.user_id)
+            if not flags.empty:
+                st.subheader("Unusual Transactions")
+                st.dataframe(flags)
+            
             # Display recommendations
             st.subheader("Recommendations")
             recommendations = risk_analyzer.get_risk_recommendations(risk_analysis)
             for rec in recommendations:
                 st.write(f"- {rec}")
-            
-            # Save risk analysis
-            db.save_risk_analysis(
-                st.session_state.user_id,
-                risk_analysis['risk_level'],
-                risk_analysis['savings_buffer']
-            )
         else:
             st.info("Upload transactions to get a risk assessment.")
 
@@ -205,7 +371,7 @@ elif selected == "Advisor":
     if not st.session_state.user_id:
         st.warning("Please complete registration on the Home page first.")
     else:
-        transactions_df = db.get_user_transactions(st.session_state.user_id)
+        transactions_df = st.session_state.transaction_cache.get(st.session_state.user_id)
         
         if not transactions_df.empty:
             # Get latest risk analysis
@@ -213,23 +379,38 @@ elif selected == "Advisor":
             print("TYPE CHECK →", type(risk_analysis))
             risk_level = risk_analysis['risk_level'] if (risk_analysis is not None and not getattr(risk_analysis, 'empty', False)) else 'Medium'
             
-            # Generate advice
-            advice = budget_advisor.generate_advice(
-                st.session_state.monthly_income,
-                transactions_df,
-                risk_level
+            # Generate advice in the background
+            job_id = job_queue.enqueue(
+                'advice',
+                st.session_state.user_id,
+                {'monthly_income': st.session_state.monthly_income, 'risk_level': risk_level},
+                fingerprint(
+                    'advice',
+                    st.session_state.user_id,
+                    db.get_data_version(st.session_state.user_id),
+                    st.session_state.monthly_income,
+                    risk_level
+                )
             )
             
             # Display advice
             st.subheader("Personalized Financial Advice")
-            st.write(advice)
+            advice = job_result(job_queue.get(job_id))
+            if advice is not None:
+                st.write(advice)
             
             # Display spending insights
             st.subheader("Spending Insights")
-            insights = budget_advisor.get_spending_insights(transactions_df)
+            subscriptions = recurring_detector.get_subscriptions(st.session_state.user_id)
+            insights = budget_advisor.get_spending_insights(transactions_df, subscriptions)
             for insight in insights:
                 st.write(f"- {insight}")
 
+            # Display detected subscriptions
+            if not subscriptions.empty:
+                st.subheader("Subscriptions")
+                st.dataframe(subscriptions)
+
             # Show financial chatbot
             budget_advisor.financial_chatbot()
         else:
@@ -237,4 +418,7 @@ elif selected == "Advisor":
 
 # Add footer
 st.markdown("---")
-st.markdown("By YASHI ") 
+st.markdown("By YASHI ")
+
+# Keep polling background jobs shown on this page
+rerun_while_pending()
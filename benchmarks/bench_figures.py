@@ -0,0 +1,70 @@
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from figures import FigureCache
+from portfolio import PortfolioAnalyzer
+from synthetic import generate_transactions
+from transactions import TransactionClassifier
+
+N_TRANSACTIONS = 1_000_000
+TICKERS = ['AAPL', 'MSFT', 'GOOG', 'AMZN', 'NVDA']
+N_PRICES = 100_000  # about a year of minute bars per ticker
+REPEATS = 5
+
+
+def timed(func, repeats=REPEATS):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def price_histories(seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2023-01-03 09:30', periods=N_PRICES, freq='min', tz='America/New_York')
+    return {
+        ticker: pd.DataFrame({'Close': 100 * np.exp(np.cumsum(rng.normal(0, 0.001, N_PRICES)))}, index=index)
+        for ticker in TICKERS
+    }
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        cache = FigureCache(db)
+        # Plotting does not touch the LLM, so skip the classifier's constructor
+        classifier = TransactionClassifier.__new__(TransactionClassifier)
+        portfolio_analyzer = PortfolioAnalyzer(db)
+
+        transactions_df = generate_transactions(N_TRANSACTIONS, n_days=3650)
+        portfolio_df = pd.DataFrame({'ticker': TICKERS})
+        histories = price_histories()
+
+        cases = [
+            ('spending breakdown', lambda: classifier.plot_spending_breakdown(transactions_df)),
+            ('price trends, raw', lambda: portfolio_analyzer.plot_price_trends(portfolio_df, max_points=N_PRICES, histories=histories)),
+            ('price trends, LTTB 200', lambda: portfolio_analyzer.plot_price_trends(portfolio_df, histories=histories))
+        ]
+
+        print(f"{'figure':<24}{'build+json (s)':>16}{'cache hit (s)':>15}{'payload (KB)':>14}")
+        # Cache hits include re-serialization, which st.plotly_chart still performs
+        for name, build in cases:
+            uncached = timed(lambda: build().to_json(), 2)
+            cache.get((name,), build)
+            cached = timed(lambda: cache.get((name,), build).to_json())
+            payload = len(build().to_json()) / 1024
+            print(f"{name:<24}{uncached:>16.3f}{cached:>15.3f}{payload:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
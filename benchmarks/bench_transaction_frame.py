@@ -0,0 +1,74 @@
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, TransactionFrameCache
+from risk import RiskAnalyzer
+from synthetic import generate_transactions
+
+N_ROWS = 1_000_000
+REPEATS = 5
+
+
+def timed(func, repeats=REPEATS):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def load_untyped(db, user_id):
+    # The columns load_transactions_frame returns, read the way get_user_transactions does
+    conn = db.get_connection()
+    df = pd.read_sql_query(
+        "SELECT id, date, amount, merchant, category FROM transactions WHERE user_id = ?",
+        conn,
+        params=(user_id,)
+    )
+    conn.close()
+    return df
+
+
+def analysis_workload(df, risk_analyzer):
+    # The groupbys RiskAnalyzer, TransactionClassifier and BudgetAdvisor run per page view
+    risk_analyzer.calculate_risk_level(5000.0, df)
+    df.groupby('category', observed=True).agg({'amount': ['sum', 'count', 'mean']})
+    df.groupby('category', observed=True)['amount'].sum()
+    df.groupby('merchant', observed=True)['amount'].agg(['sum', 'count'])
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        user_id = db.add_user('bench', 5000.0)
+        db.save_transactions(user_id, generate_transactions(N_ROWS, n_days=3650).drop(columns=['is_anomaly']))
+        risk_analyzer = RiskAnalyzer(db)
+
+        untyped = load_untyped(db, user_id)
+        typed = db.load_transactions_frame(user_id)
+
+        cache = TransactionFrameCache(db)
+        cache.get(user_id)
+
+        # Both columns load the same five columns from SQLite, uncached
+        rows = [
+            ('load (s)', timed(lambda: load_untyped(db, user_id), 2), timed(lambda: db.load_transactions_frame(user_id), 2)),
+            ('memory (MB)', untyped.memory_usage(deep=True).sum() / 2 ** 20, typed.memory_usage(deep=True).sum() / 2 ** 20),
+            ('groupbys (s)', timed(lambda: analysis_workload(untyped, risk_analyzer)), timed(lambda: analysis_workload(typed, risk_analyzer)))
+        ]
+
+        print(f"{N_ROWS:,} transactions")
+        print(f"{'':<14}{'object frame':>14}{'typed frame':>14}{'speedup':>10}")
+        for name, before, after in rows:
+            print(f"{name:<14}{before:>14.3f}{after:>14.3f}{before / after:>9.1f}x")
+        print(f"TransactionFrameCache hit (s): {timed(lambda: cache.get(user_id)):.6f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anomaly import AnomalyDetector
+from database import Database
+from synthetic import generate_transactions
+
+N_ROWS = 5000
+N_DAYS = 730
+UPLOAD_SIZE = 500  # rows per simulated CSV upload
+SEEDS = [1, 2, 3]
+
+
+def score(seed):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'check.db'))
+        user_id = db.add_user('check', 5000.0)
+        detector = AnomalyDetector(db)
+
+        transactions_df = generate_transactions(N_ROWS, n_days=N_DAYS, seed=seed)
+        truth = transactions_df.pop('is_anomaly')
+        injected = set(zip(
+            transactions_df.loc[truth, 'date'],
+            transactions_df.loc[truth, 'merchant'],
+            transactions_df.loc[truth, 'amount']
+        ))
+
+        flagged = set()
+        for start in range(0, N_ROWS, UPLOAD_SIZE):
+            flags = db.save_transactions(user_id, transactions_df.iloc[start:start + UPLOAD_SIZE].copy(), detector)
+            flagged.update(zip(flags['date'], flags['merchant'], flags['amount']))
+
+        hits = len(flagged & injected)
+        return len(injected), len(flagged), hits
+
+
+def main():
+    print(f"{N_ROWS:,} transactions over {N_DAYS} days, uploaded {UPLOAD_SIZE} at a time")
+    print(f"{'seed':<6}{'injected':>10}{'flagged':>10}{'precision':>11}{'recall':>9}")
+    for seed in SEEDS:
+        injected, flagged, hits = score(seed)
+        precision = hits / flagged if flagged else 0.0
+        recall = hits / injected if injected else 0.0
+        print(f"{seed:<6}{injected:>10}{flagged:>10}{precision:>11.2f}{recall:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
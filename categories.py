@@ -0,0 +1,176 @@
+import re
+from datetime import datetime
+
+from merchants import normalize_merchant, rule_text
+
+DEFAULT_PATTERNS = {
+    'Food': r'(restaurant|cafe|food|grocery|supermarket|dining)',
+    'Travel': r'(uber|lyft|taxi|flight|hotel|airbnb|travel)',
+    'Shopping': r'(amazon|walmart|target|shop|store|mall)',
+    'Bills': r'(electric|water|gas|internet|phone|utility)',
+    'Entertainment': r'(netflix|spotify|hulu|movie|theater)',
+    'Healthcare': r'(pharmacy|doctor|hospital|medical)',
+    'Education': r'(school|university|course|book|education)',
+    'Transportation': r'(gas|fuel|car|bus|train|metro)',
+    'Other': r'.*'
+}
+
+
+def compile_patterns(patterns):
+    # Merchants are lowercased before matching; IGNORECASE keeps patterns typed in capitals working
+    return [(category, re.compile(pattern, re.IGNORECASE)) for category, pattern in patterns.items()]
+
+
+def match_category(merchant, compiled_patterns):
+    text = rule_text(merchant)
+    for category, pattern in compiled_patterns:
+        if pattern.search(text):
+            return category
+    return None
+
+
+class CategoryRules:
+    def __init__(self, db, batch_size=5000):
+        self.db = db
+        self.batch_size = batch_size
+
+    def active(self):
+        conn = self.db.get_connection()
+        row = conn.execute("SELECT MAX(version) FROM rule_versions").fetchone()
+        if row[0] is None:
+            conn.close()
+            return self.save(DEFAULT_PATTERNS, recategorize=False), dict(DEFAULT_PATTERNS)
+
+        version = row[0]
+        rules = conn.execute(
+            "SELECT category, pattern FROM category_rules WHERE version = ? ORDER BY position",
+            (version,)
+        ).fetchall()
+        conn.close()
+        return version, dict(rules)
+
+    def save(self, patterns, recategorize=True, anomaly_detector=None):
+        for category, pattern in patterns.items():
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"Invalid pattern for {category}: {e}")
+
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO rule_versions (created_at) VALUES (?)", (datetime.now(),))
+        version = cursor.lastrowid
+        cursor.executemany(
+            "INSERT INTO category_rules (version, position, category, pattern) VALUES (?, ?, ?, ?)",
+            [(version, position, category, pattern) for position, (category, pattern) in enumerate(patterns.items())]
+        )
+        conn.commit()
+        conn.close()
+
+        if recategorize:
+            self.recategorize(anomaly_detector)
+        return version
+
+    def lookup(self, merchants, version):
+        # Categories already computed under the active rules, keyed by rule_text(merchant)
+        conn = self.db.get_connection()
+        found = {}
+        names = list(merchants)
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            found.update(conn.execute(
+                f"SELECT merchant, category FROM merchant_categories WHERE rule_version = ? AND merchant IN ({','.join('?' * len(chunk))})",
+                (version, *chunk)
+            ).fetchall())
+        conn.close()
+        return found
+
+    def record(self, categories, version):
+        # categories: rule_text(merchant) -> category
+        conn = self.db.get_connection()
+        conn.executemany(
+            "INSERT OR REPLACE INTO merchant_categories (merchant, merchant_key, category, rule_version) VALUES (?, ?, ?, ?)",
+            [(merchant, normalize_merchant(merchant), category, version) for merchant, category in categories.items()]
+        )
+        conn.commit()
+        conn.close()
+
+    def recategorize(self, anomaly_detector=None):
+        version, patterns = self.active()
+        compiled = compile_patterns(patterns)
+
+        conn = self.db.get_connection()
+        self._backfill_merchant_keys(conn)
+
+        # Walk only the merchants categorized under an older rule version, in name order
+        affected_users = set()
+        last_merchant = ''
+        while True:
+            merchants = conn.execute(
+                "SELECT merchant, merchant_key, category FROM merchant_categories WHERE rule_version < ? AND merchant > ? ORDER BY merchant LIMIT ?",
+                (version, last_merchant, self.batch_size)
+            ).fetchall()
+            if not merchants:
+                break
+            last_merchant = merchants[-1][0]
+
+            updates = []
+            batch_users = set()
+            for merchant, merchant_key, old_category in merchants:
+                new_category = match_category(merchant, compiled) or old_category
+                updates.append((new_category, version, merchant))
+                if new_category != old_category:
+                    batch_users.update(self._retag_transactions(conn, merchant, merchant_key, new_category))
+
+            conn.executemany(
+                "UPDATE merchant_categories SET category = ?, rule_version = ? WHERE merchant = ?",
+                updates
+            )
+            # Bumping data_version invalidates cached frames and risk/advice jobs of affected users.
+            # Commit per batch so an interrupted run resumes where it stopped.
+            for user_id in batch_users:
+                self.db.bump_data_version(user_id, conn)
+            conn.commit()
+            affected_users |= batch_users
+
+        if anomaly_detector is not None:
+            for user_id in affected_users:
+                anomaly_detector.rebuild_category_stats(user_id, conn)
+            conn.commit()
+        conn.close()
+        return affected_users
+
+    def _retag_transactions(self, conn, merchant, merchant_key, category):
+        # The merchant_key index narrows the scan; rule_text picks the exact spelling the rules saw
+        users = [row[0] for row in conn.execute(
+            "SELECT DISTINCT user_id FROM transactions WHERE merchant_key = ? AND rule_text(merchant) = ? AND category IS NOT ?",
+            (merchant_key, merchant, category)
+        )]
+        if users:
+            conn.execute(
+                "UPDATE transactions SET category = ? WHERE merchant_key = ? AND rule_text(merchant) = ? AND category IS NOT ?",
+                (category, merchant_key, merchant, category)
+            )
+        return users
+
+    def _backfill_merchant_keys(self, conn):
+        # Rows saved before merchant keys existed get theirs computed inside SQLite, one id range at a time
+        conn.create_function('normalize_merchant', 1, normalize_merchant, deterministic=True)
+        conn.create_function('rule_text', 1, rule_text, deterministic=True)
+        while True:
+            start = conn.execute("SELECT MIN(id) FROM transactions WHERE merchant_key IS NULL").fetchone()[0]
+            if start is None:
+                break
+            end = start + self.batch_size
+            conn.execute(
+                "UPDATE transactions SET merchant_key = normalize_merchant(merchant) WHERE id >= ? AND id < ? AND merchant_key IS NULL",
+                (start, end)
+            )
+            # Unindexed merchants enter at version 0, keeping their stored category, so the next pass re-matches them
+            conn.execute(
+                "INSERT OR IGNORE INTO merchant_categories (merchant, merchant_key, category, rule_version) "
+                "SELECT rule_text(merchant), merchant_key, MIN(category), 0 FROM transactions WHERE id >= ? AND id < ? "
+                "GROUP BY rule_text(merchant)",
+                (start, end)
+            )
+            conn.commit()
@@ -8,12 +8,16 @@ class Database:
         self.init_db()
 
     def get_connection(self):
-        return sqlite3.connect(self.db_name)
+        # Several processes (UI and worker) share the store, so wait on locks instead of failing
+        return sqlite3.connect(self.db_name, timeout=30)
 
     def init_db(self):
         conn = self.get_connection()
         cursor = conn.cursor()
 
+        # WAL lets readers proceed while a worker process is writing
+        cursor.execute("PRAGMA journal_mode = WAL")
+
         # Create users table
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -34,10 +38,13 @@ class Database:
             amount REAL,
             merchant TEXT,
             category TEXT,
+            merchant_key TEXT,
             FOREIGN KEY (user_id) REFERENCES users (id)
         )
         ''')
 
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_user ON transactions (user_id)")
+
         # Create portfolio table
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS portfolio (
@@ -63,6 +70,139 @@ class Database:
         )
         ''')
 
+        # Create recurring_merchants table (running per-merchant charge statistics)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS recurring_merchants (
+            user_id INTEGER,
+            merchant_key TEXT,
+            merchant TEXT,
+            n_charges INTEGER,
+            first_date TIMESTAMP,
+            last_date TIMESTAMP,
+            last_amount REAL,
+            total_amount REAL,
+            weekly_hits INTEGER,
+            monthly_hits INTEGER,
+            annual_hits INTEGER,
+            stable_steps INTEGER,
+            PRIMARY KEY (user_id, merchant_key),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''')
+
+        # Create running per-category statistics for anomaly detection
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS category_stats (
+            user_id INTEGER,
+            category TEXT,
+            n INTEGER,
+            mean REAL,
+            m2 REAL,
+            ewma REAL,
+            PRIMARY KEY (user_id, category),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''')
+
+        # Create running per-merchant statistics for anomaly detection
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS merchant_stats (
+            user_id INTEGER,
+            merchant_key TEXT,
+            n INTEGER,
+            mean REAL,
+            m2 REAL,
+            PRIMARY KEY (user_id, merchant_key),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''')
+
+        # Create transaction_flags table
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transaction_flags (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            date TIMESTAMP,
+            merchant TEXT,
+            category TEXT,
+            amount REAL,
+            reason TEXT,
+            flagged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''')
+
+        # Create jobs table (durable background work queue)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            user_id INTEGER,
+            fingerprint TEXT UNIQUE NOT NULL,
+            state TEXT NOT NULL,
+            attempts INTEGER DEFAULT 0,
+            max_attempts INTEGER DEFAULT 3,
+            progress REAL DEFAULT 0,
+            message TEXT,
+            payload TEXT,
+            result TEXT,
+            error TEXT,
+            locked_by TEXT,
+            run_after TIMESTAMP,
+            created_at TIMESTAMP,
+            updated_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, run_after)")
+
+        # Create versioned category rules
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rule_versions (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TIMESTAMP
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS category_rules (
+            version INTEGER,
+            position INTEGER,
+            category TEXT,
+            pattern TEXT,
+            PRIMARY KEY (version, position),
+            FOREIGN KEY (version) REFERENCES rule_versions (version)
+        )
+        ''')
+
+        # Create merchant_categories table (lowercased merchant -> category under a rule version).
+        # Rules match the lowercased merchant; merchant_key only locates its transactions.
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS merchant_categories (
+            merchant TEXT PRIMARY KEY,
+            merchant_key TEXT,
+            category TEXT,
+            rule_version INTEGER
+        )
+        ''')
+
+        # Create figure_cache table (serialized Plotly figures keyed on a data fingerprint)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS figure_cache (
+            cache_key TEXT PRIMARY KEY,
+            payload TEXT,
+            created_at TIMESTAMP
+        )
+        ''')
+
+        # Add columns introduced after the initial schema
+        cursor.execute("PRAGMA table_info(users)")
+        if 'data_version' not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE users ADD COLUMN data_version INTEGER DEFAULT 0")
+        cursor.execute("PRAGMA table_info(transactions)")
+        if 'merchant_key' not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE transactions ADD COLUMN merchant_key TEXT")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_merchant_key ON transactions (merchant_key)")
+
         conn.commit()
         conn.close()
 
@@ -81,11 +221,49 @@ class Database:
         finally:
             conn.close()
 
-    def save_transactions(self, user_id, transactions_df):
-        conn = self.get_connection()
+    def save_transactions(self, user_id, transactions_df, anomaly_detector=None, on_saved=None):
         transactions_df['user_id'] = user_id
-        transactions_df.to_sql('transactions', conn, if_exists='append', index=False)
+        conn = self.get_connection()
+        try:
+            # Insert on this connection (to_sql would commit on its own) so the rows, the
+            # anomaly statistics and the data_version bump commit or roll back together
+            table_columns = [row[1] for row in conn.execute("PRAGMA table_info(transactions)")]
+            columns = [column for column in transactions_df.columns if column in table_columns and column != 'id']
+            rows = transactions_df[columns].astype(object).where(transactions_df[columns].notna(), None)
+            conn.executemany(
+                f"INSERT INTO transactions ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                rows.itertuples(index=False, name=None)
+            )
+            # The write lock is held, so the new rows take consecutive ids ending at the last insert
+            last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            row_ids = (last_id - len(rows) + 1, last_id)
+
+            # Score the new rows and fold them into the running statistics
+            flags = None
+            if anomaly_detector is not None:
+                flags = anomaly_detector.ingest(user_id, transactions_df, conn)
+
+            self.bump_data_version(user_id, conn)
+
+            # Let the caller record its own bookkeeping in the same transaction
+            if on_saved is not None:
+                on_saved(conn, flags, row_ids)
+            conn.commit()
+            return flags
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def bump_data_version(self, user_id, conn):
+        conn.execute("UPDATE users SET data_version = data_version + 1 WHERE id = ?", (user_id,))
+
+    def get_data_version(self, user_id):
+        conn = self.get_connection()
+        row = conn.execute("SELECT data_version FROM users WHERE id = ?", (user_id,)).fetchone()
         conn.close()
+        return row[0] if row else None
 
     def get_user_transactions(self, user_id):
         conn = self.get_connection()
@@ -94,6 +272,26 @@ class Database:
         conn.close()
         return df
 
+    def load_transactions_frame(self, user_id, row_ids=None):
+        # row_ids: optional inclusive (first, last) id range, e.g. the rows of one upload
+        query = "SELECT id, date, amount, merchant, category FROM transactions WHERE user_id = ?"
+        params = (user_id,)
+        if row_ids is not None:
+            query += " AND id BETWEEN ? AND ?"
+            params += tuple(row_ids)
+        conn = self.get_connection()
+        df = pd.read_sql_query(query, conn, params=params)
+        conn.close()
+
+        # Compact dtypes: repeated strings become categoricals, dates become datetime64.
+        # Rows saved before uploads were normalized may hold other date formats; unparseable ones become NaT
+        return df.astype({
+            'id': 'int64',
+            'amount': 'float32',
+            'merchant': 'category',
+            'category': 'category'
+        }).assign(date=pd.to_datetime(df['date'], format='mixed', errors='coerce'))
+
     def save_portfolio(self, user_id, ticker, quantity, purchase_price):
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -111,6 +309,12 @@ class Database:
         conn.close()
         return df
 
+    def get_portfolio_version(self, user_id):
+        conn = self.get_connection()
+        row = conn.execute("SELECT COUNT(*), MAX(id) FROM portfolio WHERE user_id = ?", (user_id,)).fetchone()
+        conn.close()
+        return row
+
     def save_risk_analysis(self, user_id, risk_level, savings_buffer):
         conn = self.get_connection()
         cursor = conn.cursor()
@@ -131,4 +335,96 @@ class Database:
         """
         df = pd.read_sql_query(query, conn)
         conn.close()
-        return df.iloc[0] if not df.empty else None 
\ No newline at end of file
+        return df.iloc[0] if not df.empty else None 
+
+    def get_recurring_state(self, user_id):
+        conn = self.get_connection()
+        df = pd.read_sql_query(
+            "SELECT * FROM recurring_merchants WHERE user_id = ?",
+            conn,
+            params=(user_id,)
+        )
+        conn.close()
+        return df.drop(columns=['user_id'])
+
+    def save_recurring_state(self, user_id, state_df, replace=False, on_saved=None):
+        rows = [
+            (
+                user_id, row.merchant_key, row.merchant, int(row.n_charges),
+                str(row.first_date), str(row.last_date), float(row.last_amount), float(row.total_amount),
+                int(row.weekly_hits), int(row.monthly_hits), int(row.annual_hits), int(row.stable_steps)
+            )
+            for row in state_df.itertuples(index=False)
+        ]
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            if replace:
+                cursor.execute("DELETE FROM recurring_merchants WHERE user_id = ?", (user_id,))
+            cursor.executemany(
+                "INSERT OR REPLACE INTO recurring_merchants VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            # Let the caller record its own bookkeeping in the same transaction
+            if on_saved is not None:
+                on_saved(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def get_anomaly_stats(self, user_id, conn):
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT category, n, mean, m2, ewma FROM category_stats WHERE user_id = ?",
+            (user_id,)
+        )
+        category_stats = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+        cursor.execute(
+            "SELECT merchant_key, n, mean, m2 FROM merchant_stats WHERE user_id = ?",
+            (user_id,)
+        )
+        merchant_stats = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+        return category_stats, merchant_stats
+
+    def save_anomaly_stats(self, user_id, category_stats, merchant_stats, flags, conn):
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT OR REPLACE INTO category_stats (user_id, category, n, mean, m2, ewma) VALUES (?, ?, ?, ?, ?, ?)",
+            [(user_id, category) + tuple(stats) for category, stats in category_stats.items()]
+        )
+        cursor.executemany(
+            "INSERT OR REPLACE INTO merchant_stats (user_id, merchant_key, n, mean, m2) VALUES (?, ?, ?, ?, ?)",
+            [(user_id, merchant_key) + tuple(stats) for merchant_key, stats in merchant_stats.items()]
+        )
+        cursor.executemany(
+            "INSERT INTO transaction_flags (user_id, date, merchant, category, amount, reason) VALUES (?, ?, ?, ?, ?, ?)",
+            flags
+        )
+
+    def get_transaction_flags(self, user_id, limit=50):
+        conn = self.get_connection()
+        df = pd.read_sql_query(
+            "SELECT date, merchant, category, amount, reason FROM transaction_flags WHERE user_id = ? ORDER BY date DESC, id DESC LIMIT ?",
+            conn,
+            params=(user_id, limit)
+        )
+        conn.close()
+        return df
+
+
+class TransactionFrameCache:
+    # Per-session cache of typed transaction frames, keyed on the user's data_version
+    def __init__(self, db):
+        self.db = db
+        self.frames = {}
+
+    def get(self, user_id):
+        version = self.db.get_data_version(user_id)
+        cached = self.frames.get(user_id)
+        if cached is None or cached[0] != version:
+            cached = (version, self.db.load_transactions_frame(user_id))
+            self.frames[user_id] = cached
+        return cached[1]
\ No newline at end of file
@@ -0,0 +1,65 @@
+import numpy as np
+import plotly.io as pio
+from datetime import datetime
+
+from payloads import fingerprint
+
+
+def lttb(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: keep the points that best preserve the visual shape
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Average of the next bucket is the third triangle vertex
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        selected[i + 1] = previous
+    return selected
+
+
+class FigureCache:
+    def __init__(self, db, max_entries=500):
+        self.db = db
+        self.max_entries = max_entries
+
+    def get(self, key_parts, build):
+        # key_parts must change whenever the figure's data does (e.g. include a data_version)
+        cache_key = fingerprint(*key_parts)
+        conn = self.db.get_connection()
+        row = conn.execute("SELECT payload FROM figure_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+        if row is not None:
+            conn.close()
+            return pio.from_json(row[0], skip_invalid=True)
+
+        fig = build()
+        if fig is not None:
+            conn.execute(
+                "INSERT OR REPLACE INTO figure_cache (cache_key, payload, created_at) VALUES (?, ?, ?)",
+                (cache_key, fig.to_json(), datetime.now())
+            )
+            conn.execute(
+                "DELETE FROM figure_cache WHERE cache_key NOT IN "
+                "(SELECT cache_key FROM figure_cache ORDER BY created_at DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            conn.commit()
+        conn.close()
+        return fig
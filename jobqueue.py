@@ -0,0 +1,287 @@
+import json
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from io import StringIO
+
+import pandas as pd
+
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class LeaseLost(Exception):
+    # The job was requeued and claimed elsewhere while this worker still held it
+    pass
+
+
+class JobQueue:
+    def __init__(self, db, retry_delay=2.0):
+        self.db = db
+        self.retry_delay = retry_delay
+
+    def enqueue(self, kind, user_id, payload, job_fingerprint, max_attempts=3):
+        # Submitting the same fingerprint twice returns the existing job
+        conn = self.db.get_connection()
+        now = datetime.now()
+        conn.execute(
+            """INSERT OR IGNORE INTO jobs
+            (kind, user_id, fingerprint, state, attempts, max_attempts, progress, payload, run_after, created_at, updated_at)
+            VALUES (?, ?, ?, ?, 0, ?, 0, ?, ?, ?, ?)""",
+            (kind, user_id, job_fingerprint, QUEUED, max_attempts, json.dumps(payload, default=float), now, now, now)
+        )
+        conn.commit()
+        job_id = conn.execute("SELECT id FROM jobs WHERE fingerprint = ?", (job_fingerprint,)).fetchone()[0]
+        conn.close()
+        return job_id
+
+    def get(self, job_id):
+        conn = self.db.get_connection()
+        conn.row_factory = _row_to_dict
+        job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        conn.close()
+        return job
+
+    def claim(self, worker_name):
+        conn = self.db.get_connection()
+        conn.isolation_level = None
+        conn.row_factory = _row_to_dict
+        try:
+            # IMMEDIATE takes the write lock up front so two workers can't claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            now = datetime.now()
+            job = conn.execute(
+                "SELECT * FROM jobs WHERE state = ? AND run_after <= ? AND attempts < max_attempts ORDER BY id LIMIT 1",
+                (QUEUED, now)
+            ).fetchone()
+            if job is not None:
+                # The lease token ties every later write to this particular claim
+                lease = f"{worker_name}:{uuid.uuid4().hex}"
+                conn.execute(
+                    "UPDATE jobs SET state = ?, attempts = attempts + 1, locked_by = ?, updated_at = ? WHERE id = ?",
+                    (RUNNING, lease, now, job['id'])
+                )
+                job.update(state=RUNNING, attempts=job['attempts'] + 1, locked_by=lease, lease=lease)
+            conn.execute("COMMIT")
+            return job
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def heartbeat(self, job_id, lease):
+        return self._update(job_id, lease) > 0
+
+    def set_progress(self, job_id, lease, progress, message=None):
+        if not self._update(job_id, lease, progress=progress, message=message):
+            raise LeaseLost(f"Job {job_id} is no longer held by {lease}")
+
+    def save_partial_result(self, job_id, lease, result, progress=None, message=None, conn=None):
+        # Pass conn to record the stage marker inside the caller's transaction
+        fields = {'result': json.dumps(result, default=float)}
+        if progress is not None:
+            fields.update(progress=progress, message=message)
+        if not self._update(job_id, lease, conn=conn, **fields):
+            raise LeaseLost(f"Job {job_id} is no longer held by {lease}")
+
+    def complete(self, job_id, lease, result):
+        # A finished job no longer needs its input (an upload's whole CSV)
+        return self._update(
+            job_id, lease,
+            state=DONE, progress=1.0, result=json.dumps(result, default=float), error=None, locked_by=None,
+            payload=None
+        ) > 0
+
+    def fail(self, job_id, lease, error):
+        job = self.get(job_id)
+        if job['attempts'] < job['max_attempts']:
+            # Back off exponentially before the next attempt
+            run_after = datetime.now() + timedelta(seconds=self.retry_delay * 2 ** (job['attempts'] - 1))
+            self._update(job_id, lease, state=QUEUED, error=error, run_after=run_after, locked_by=None)
+        else:
+            self._update(job_id, lease, state=FAILED, error=error, locked_by=None)
+
+    def retry(self, job_id):
+        self._update(job_id, None, state=QUEUED, attempts=0, error=None, run_after=datetime.now())
+
+    def recover(self, stale_after=300):
+        # Requeue jobs whose worker stopped heartbeating (e.g. the server restarted). A job that
+        # has used up its attempts may be what killed the worker, so it fails instead.
+        conn = self.db.get_connection()
+        stale_before = datetime.now() - timedelta(seconds=stale_after)
+        conn.execute(
+            "UPDATE jobs SET state = ?, locked_by = NULL, error = ? "
+            "WHERE state = ? AND updated_at < ? AND attempts >= max_attempts",
+            (FAILED, "Worker stopped while running the last attempt", RUNNING, stale_before)
+        )
+        cursor = conn.execute(
+            "UPDATE jobs SET state = ?, locked_by = NULL WHERE state = ? AND updated_at < ?",
+            (QUEUED, RUNNING, stale_before)
+        )
+        conn.commit()
+        conn.close()
+        return cursor.rowcount
+
+    def purge(self, max_age_days=30):
+        # Drop old finished risk/advice results; they are keyed on data versions that have moved on.
+        # Upload jobs stay, since their fingerprint is what stops a re-uploaded file saving twice.
+        conn = self.db.get_connection()
+        cursor = conn.execute(
+            "DELETE FROM jobs WHERE kind != 'upload' AND state IN (?, ?) AND updated_at < ?",
+            (DONE, FAILED, datetime.now() - timedelta(days=max_age_days))
+        )
+        conn.commit()
+        conn.close()
+        return cursor.rowcount
+
+    def _update(self, job_id, lease, conn=None, **fields):
+        # With a lease, the write only lands if this claim still holds the job
+        fields['updated_at'] = datetime.now()
+        assignments = ', '.join(f"{column} = ?" for column in fields)
+        query = f"UPDATE jobs SET {assignments} WHERE id = ?"
+        params = (*fields.values(), job_id)
+        if lease is not None:
+            query += " AND locked_by = ?"
+            params += (lease,)
+        if conn is not None:
+            return conn.execute(query, params).rowcount
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.execute(query, params)
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+
+class JobWorkerPool:
+    def __init__(self, queue, handlers, threads=2, poll_interval=0.5, heartbeat=30, stale_after=300):
+        self.queue = queue
+        self.handlers = handlers
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.stale_after = stale_after
+        self.stop_event = threading.Event()
+        self.workers = []
+
+    def start(self):
+        self.queue.recover(self.stale_after)
+        self.queue.purge()
+        for i in range(self.threads):
+            worker = threading.Thread(target=self._run, args=(f"worker-{i}",), daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        for worker in self.workers:
+            worker.join()
+
+    def _run(self, worker_name):
+        last_recover = time.monotonic()
+        while not self.stop_event.is_set():
+            if time.monotonic() - last_recover > self.heartbeat:
+                self.queue.recover(self.stale_after)
+                last_recover = time.monotonic()
+
+            job = self.queue.claim(worker_name)
+            if job is None:
+                self.stop_event.wait(self.poll_interval)
+                continue
+
+            def progress(fraction, message=None, job_id=job['id'], lease=job['lease']):
+                self.queue.set_progress(job_id, lease, fraction, message)
+
+            # Keep the lease fresh while the handler runs so recover() never steals a live job
+            done = threading.Event()
+            beat = threading.Thread(target=self._heartbeat, args=(job, done), daemon=True)
+            beat.start()
+            try:
+                job['payload'] = json.loads(job['payload'])
+                result = self.handlers[job['kind']](job, progress)
+                self.queue.complete(job['id'], job['lease'], result)
+            except LeaseLost:
+                pass
+            except Exception:
+                self.queue.fail(job['id'], job['lease'], traceback.format_exc(limit=3))
+            finally:
+                done.set()
+                beat.join()
+
+    def _heartbeat(self, job, done):
+        interval = min(self.heartbeat, self.stale_after / 3)
+        while not done.wait(interval):
+            if not self.queue.heartbeat(job['id'], job['lease']):
+                break
+
+
+def make_handlers(queue, db, classify, calculate_risk, budget_advisor, anomaly_detector, recurring_detector, category_rules):
+    # Stage markers let a retried upload resume without saving or counting the rows twice
+    saved_progress = 0.6
+    recurring_progress = 0.9
+
+    def run_upload(job, progress):
+        user_id = job['user_id']
+        if job['progress'] < saved_progress:
+            progress(0.1, "Classifying transactions")
+            processed_df = classify(pd.read_csv(StringIO(job['payload']['csv'])))
+            progress(0.5, "Saving transactions")
+            # The stage marker commits with the rows, so a retry never saves them twice
+            # Only a summary is kept; the rows themselves are read back from transactions
+            db.save_transactions(
+                user_id, processed_df, anomaly_detector,
+                on_saved=lambda conn, flags, row_ids: queue.save_partial_result(
+                    job['id'], job['lease'],
+                    {'rows': len(processed_df), 'flags': len(flags), 'row_ids': row_ids},
+                    saved_progress, "Detecting recurring charges", conn
+                )
+            )
+        partial = json.loads(queue.get(job['id'])['result'])
+        if job['progress'] < recurring_progress:
+            recurring_detector.update(
+                user_id, db.load_transactions_frame(user_id, partial['row_ids']),
+                on_saved=lambda conn: queue.save_partial_result(
+                    job['id'], job['lease'], partial, recurring_progress, "Finishing", conn
+                )
+            )
+        return partial
+
+    def run_risk(job, progress):
+        progress(0.2, "Scoring risk")
+        risk_analysis = calculate_risk(job['user_id'], job['payload']['monthly_income'])
+        db.save_risk_analysis(job['user_id'], risk_analysis['risk_level'], risk_analysis['savings_buffer'])
+        return risk_analysis
+
+    def run_advice(job, progress):
+        progress(0.2, "Asking the advisor")
+        transactions_df = db.load_transactions_frame(job['user_id'])
+        return budget_advisor.generate_advice(
+            job['payload']['monthly_income'],
+            transactions_df,
+            job['payload']['risk_level'],
+            raise_errors=True
+        )
+
+    def run_recategorize(job, progress):
+        progress(0.1, "Re-categorizing affected transactions")
+        affected_users = category_rules.recategorize(anomaly_detector)
+        return {'affected_users': len(affected_users)}
+
+    return {
+        'upload': run_upload,
+        'risk': run_risk,
+        'advice': run_advice,
+        'recategorize': run_recategorize
+    }
+
+
+def _row_to_dict(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
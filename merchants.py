@@ -0,0 +1,26 @@
+import pandas as pd
+import re
+
+_NOISE = re.compile(r'[^a-z]+')
+
+
+def rule_text(merchant):
+    # Category rules see the merchant as uploaded, only lowercased, so "at&t" and "7-eleven" can match
+    return str(merchant).lower()
+
+
+def normalize_merchant(merchant):
+    # "NETFLIX.COM*1234 " and "Netflix.com" both become "netflix com"; names without letters ("76") keep their text
+    key = ' '.join(_NOISE.sub(' ', str(merchant).lower()).split())
+    return key or ' '.join(str(merchant).lower().split())
+
+
+def normalize_merchants(merchants):
+    # Categorical columns only need their (few) categories normalized
+    if isinstance(merchants.dtype, pd.CategoricalDtype):
+        categories = merchants.cat.categories
+        return merchants.map(dict(zip(categories, normalize_merchants(categories.to_series()))))
+
+    lowered = merchants.astype(str).str.lower()
+    keys = lowered.str.replace(_NOISE, ' ', regex=True).str.split().str.join(' ')
+    return keys.where(keys != '', lowered.str.split().str.join(' '))
@@ -0,0 +1,23 @@
+import hashlib
+from io import StringIO
+
+import pandas as pd
+
+
+def fingerprint(*parts):
+    # Stable key for job de-duplication and the figure cache
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def frame_to_json(df):
+    # DataFrames cross process boundaries (worker HTTP calls, job results) in split orientation
+    return df.to_json(orient='split', date_format='iso')
+
+
+def frame_from_json(payload):
+    # Keep values as sent: no date parsing or dtype guessing, so worker and in-process results store alike
+    return pd.read_json(StringIO(payload), orient='split', convert_dates=False, dtype=False)
@@ -5,6 +5,8 @@ import plotly.express as px
 from datetime import datetime, timedelta
 import json
 
+from figures import lttb
+
 class PortfolioAnalyzer:
     def __init__(self, db):
         self.db = db
@@ -24,13 +26,16 @@ class PortfolioAnalyzer:
                 'history': None
             }
 
-    def calculate_portfolio_value(self, portfolio_df):
+    def calculate_portfolio_value(self, portfolio_df, histories=None):
+        # Pass a dict as histories to collect each ticker's fetched price history for plot_price_trends
         if portfolio_df.empty:
             return pd.DataFrame()
 
         portfolio_data = []
         for _, row in portfolio_df.iterrows():
             stock_data = self.get_stock_data(row['ticker'])
+            if histories is not None and stock_data['history'] is not None:
+                histories[row['ticker']] = stock_data['history']
             current_value = stock_data['current_price'] * row['quantity']
             initial_value = row['purchase_price'] * row['quantity']
             gain_loss = current_value - initial_value
@@ -62,22 +67,27 @@ class PortfolioAnalyzer:
         )
         return fig
 
-    def plot_price_trends(self, portfolio_df):
+    def plot_price_trends(self, portfolio_df, period="1mo", max_points=200, histories=None):
         if portfolio_df.empty:
             return None
 
         fig = go.Figure()
-        for _, row in portfolio_df.iterrows():
-            stock = yf.Ticker(row['ticker'])
-            hist = stock.history(period="1mo")
+        for ticker in portfolio_df['ticker'].unique():
+            if histories is not None and ticker in histories:
+                hist = histories[ticker]
+            else:
+                hist = yf.Ticker(ticker).history(period=period)
+
+            # Downsample long series to a fixed point budget per trace
+            keep = lttb(hist.index.asi8, hist['Close'].to_numpy(), max_points)
             fig.add_trace(go.Scatter(
-                x=hist.index,
-                y=hist['Close'],
-                name=row['ticker']
+                x=hist.index[keep],
+                y=hist['Close'].iloc[keep],
+                name=ticker
             ))
 
         fig.update_layout(
-            title='Stock Price Trends (Last Month)',
+            title=f'Stock Price Trends ({period})',
             xaxis_title='Date',
             yaxis_title='Price',
             hovermode='x unified'
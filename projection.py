@@ -0,0 +1,108 @@
+import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+
+class SavingsProjector:
+    def __init__(self, db, n_paths=20000, horizon_months=24, chunk_size=5000, seed=42):
+        self.db = db
+        self.n_paths = n_paths
+        self.horizon_months = horizon_months
+        self.chunk_size = chunk_size
+        self.seed = seed
+
+    def monthly_category_spend(self, transactions_df):
+        if transactions_df.empty:
+            return pd.DataFrame()
+
+        # One row per calendar month, one column per category
+        months = pd.to_datetime(transactions_df['date'], format='mixed', errors='coerce').dt.to_period('M')
+        monthly = transactions_df.assign(month=months).pivot_table(
+            index='month',
+            columns='category',
+            values='amount',
+            aggfunc='sum',
+            fill_value=0.0,
+            observed=True
+        )
+        if monthly.empty:
+            return monthly
+
+        # Months with no spending are real outcomes; dropping them would bias the bootstrap upward
+        all_months = pd.period_range(monthly.index.min(), monthly.index.max(), freq='M')
+        return monthly.reindex(all_months, fill_value=0.0)
+
+    def project(self, monthly_income, transactions_df, target_buffer, current_savings=0.0, seed_key=0):
+        monthly = self.monthly_category_spend(transactions_df)
+        if monthly.empty:
+            return None
+
+        history = monthly.to_numpy(dtype=np.float64)
+        n_months, n_categories = history.shape
+        category_index = np.arange(n_categories)
+
+        # Spawn one independent stream per chunk so results don't depend on scheduling
+        n_chunks = -(-self.n_paths // self.chunk_size)
+        streams = np.random.SeedSequence([self.seed, seed_key]).spawn(n_chunks)
+
+        # Depletion is measured from a funded emergency fund (at least the target), while
+        # months-to-target counts up from the savings the user actually has
+        funded_balance = max(target_buffer, current_savings)
+        depleted_paths = 0
+        months_to_target = np.full(self.n_paths, -1, dtype=np.int16)
+
+        for chunk, stream in enumerate(streams):
+            rng = np.random.default_rng(stream)
+            start = chunk * self.chunk_size
+            size = min(self.chunk_size, self.n_paths - start)
+
+            # Bootstrap each category independently from its own monthly history
+            draws = rng.integers(0, n_months, size=(size, self.horizon_months, n_categories))
+            expenses = history[draws, category_index].sum(axis=2)
+
+            net_savings = np.cumsum(monthly_income - expenses, axis=1)
+            depleted_paths += int((funded_balance + net_savings < 0).any(axis=1).sum())
+
+            balance = current_savings + net_savings
+
+            reached = balance >= target_buffer
+            first_month = reached.argmax(axis=1) + 1
+            months_to_target[start:start + size] = np.where(reached.any(axis=1), first_month, -1)
+
+        if current_savings >= target_buffer:
+            months_to_target[:] = 0
+
+        # Percentiles run over every path, with unreached ones counted as beyond the horizon,
+        # so they are None unless enough paths reach the target
+        reached = months_to_target >= 0
+        months_all = np.where(reached, months_to_target, np.inf)
+        median_months = np.percentile(months_all, 50, method='higher')
+        p90_months = np.percentile(months_all, 90, method='higher')
+        return {
+            'n_paths': self.n_paths,
+            'horizon_months': self.horizon_months,
+            'target_buffer': target_buffer,
+            'funded_balance': funded_balance,
+            'depletion_probability': depleted_paths / self.n_paths,
+            'target_probability': int(reached.sum()) / self.n_paths,
+            'months_to_target_median': float(median_months) if np.isfinite(median_months) else None,
+            'months_to_target_p90': float(p90_months) if np.isfinite(p90_months) else None
+        }
+
+    def project_users(self, user_inputs, processes=None):
+        # user_inputs: iterable of (user_id, monthly_income, transactions_df, target_buffer, current_savings)
+        jobs = [
+            (self.n_paths, self.horizon_months, self.chunk_size, self.seed) + tuple(user_input)
+            for user_input in user_inputs
+        ]
+        if not processes or processes <= 1 or len(jobs) <= 1:
+            return dict(map(_project_user, jobs))
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return dict(executor.map(_project_user, jobs))
+
+
+def _project_user(job):
+    n_paths, horizon_months, chunk_size, seed, user_id, monthly_income, transactions_df, target_buffer, current_savings = job
+    projector = SavingsProjector(None, n_paths, horizon_months, chunk_size, seed)
+    return user_id, projector.project(monthly_income, transactions_df, target_buffer, current_savings, seed_key=user_id)
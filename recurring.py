@@ -0,0 +1,152 @@
+import pandas as pd
+import numpy as np
+
+from merchants import normalize_merchants
+
+# period name -> (expected days between charges, tolerance in days, minimum intervals)
+PERIODS = {
+    'weekly': (7, 2, 3),
+    'monthly': (30.44, 3.5, 2),
+    'annual': (365.25, 10, 1)
+}
+
+STATE_COLUMNS = [
+    'merchant_key', 'merchant', 'n_charges', 'first_date', 'last_date', 'last_amount',
+    'total_amount', 'weekly_hits', 'monthly_hits', 'annual_hits', 'stable_steps'
+]
+
+
+class RecurringDetector:
+    def __init__(self, db, amount_tolerance=0.1, min_hit_ratio=0.75):
+        self.db = db
+        self.amount_tolerance = amount_tolerance
+        self.min_hit_ratio = min_hit_ratio
+
+    def _prepare(self, transactions_df):
+        df = transactions_df[['date', 'amount', 'merchant']].copy()
+        df['date'] = pd.to_datetime(df['date'], format='mixed', errors='coerce')
+        df = df.dropna(subset=['date'])
+        df['merchant_key'] = normalize_merchants(df['merchant'])
+        df['seed'] = False
+        return df
+
+    def summarize(self, transactions_df, state=None):
+        if transactions_df.empty:
+            return state if state is not None else pd.DataFrame(columns=STATE_COLUMNS)
+
+        df = self._prepare(transactions_df)
+
+        # Seed each known merchant with its last charge so intervals continue across uploads
+        if state is not None and not state.empty:
+            state = state.assign(
+                first_date=pd.to_datetime(state['first_date']),
+                last_date=pd.to_datetime(state['last_date'])
+            )
+            seeds = state[state['merchant_key'].isin(df['merchant_key'])]
+            seed_rows = pd.DataFrame({
+                'date': seeds['last_date'],
+                'amount': seeds['last_amount'],
+                'merchant': seeds['merchant'],
+                'merchant_key': seeds['merchant_key'],
+                'seed': True
+            })
+            df = pd.concat([seed_rows, df], ignore_index=True)
+
+        df = df.sort_values(['merchant_key', 'date', 'seed'], ascending=[True, True, False], kind='stable')
+        grouped = df.groupby('merchant_key', sort=False)
+        gap_days = (df['date'] - grouped['date'].shift()).dt.days.to_numpy(dtype=np.float64)
+        prev_amount = grouped['amount'].shift().to_numpy(dtype=np.float64)
+        amount = df['amount'].to_numpy(dtype=np.float64)
+
+        # NaN gaps (first charge of a merchant) compare False everywhere
+        for period, (days, tolerance, _) in PERIODS.items():
+            df[f'{period}_hits'] = np.abs(gap_days - days) <= tolerance
+        df['stable_steps'] = np.abs(amount - prev_amount) <= self.amount_tolerance * np.abs(prev_amount)
+
+        new = df[~df['seed']]
+        summary = new.groupby('merchant_key', sort=False).agg(
+            merchant=('merchant', 'last'),
+            n_charges=('amount', 'size'),
+            first_date=('date', 'min'),
+            last_date=('date', 'max'),
+            last_amount=('amount', 'last'),
+            total_amount=('amount', 'sum'),
+            weekly_hits=('weekly_hits', 'sum'),
+            monthly_hits=('monthly_hits', 'sum'),
+            annual_hits=('annual_hits', 'sum'),
+            stable_steps=('stable_steps', 'sum')
+        ).reset_index()
+
+        if state is None or state.empty:
+            return summary[STATE_COLUMNS]
+
+        # Fold the new aggregates into the existing per-merchant state
+        merged = state.set_index('merchant_key')
+        update = summary.set_index('merchant_key')
+        known = update.index.intersection(merged.index)
+        for column in ['n_charges', 'total_amount', 'weekly_hits', 'monthly_hits', 'annual_hits', 'stable_steps']:
+            update.loc[known, column] += merged.loc[known, column]
+        update.loc[known, 'first_date'] = merged.loc[known, 'first_date']
+        merged = pd.concat([merged.drop(known), update])
+        return merged.reset_index()[STATE_COLUMNS]
+
+    def classify(self, state):
+        if state.empty:
+            return pd.DataFrame(columns=['merchant', 'frequency', 'amount', 'monthly_cost', 'last_date', 'n_charges'])
+
+        intervals = (state['n_charges'] - 1).clip(lower=1).to_numpy()
+        hits = state[[f'{period}_hits' for period in PERIODS]].to_numpy(dtype=np.float64)
+        best = hits.argmax(axis=1)
+        best_hits = hits[np.arange(len(state)), best]
+
+        period_names = np.array(list(PERIODS))
+        period_days = np.array([days for days, _, _ in PERIODS.values()])
+        min_intervals = np.array([minimum for _, _, minimum in PERIODS.values()])
+
+        last_date = pd.to_datetime(state['last_date'])
+        days_since_last = (last_date.max() - last_date).dt.days.to_numpy()
+
+        recurring = (
+            (state['n_charges'].to_numpy() - 1 >= min_intervals[best])
+            & (best_hits / intervals >= self.min_hit_ratio)
+            & (state['stable_steps'].to_numpy() / intervals >= self.min_hit_ratio)
+            # Drop subscriptions that missed more than one expected charge
+            & (days_since_last <= 2 * period_days[best])
+        )
+
+        subscriptions = pd.DataFrame({
+            'merchant': state['merchant'].to_numpy(),
+            'frequency': period_names[best],
+            'amount': state['last_amount'].to_numpy(dtype=np.float64).round(2),
+            'monthly_cost': (state['last_amount'].to_numpy(dtype=np.float64) * 30.44 / period_days[best]).round(2),
+            'last_date': last_date.dt.date.to_numpy(),
+            'n_charges': state['n_charges'].to_numpy()
+        })[recurring]
+        return subscriptions.sort_values('monthly_cost', ascending=False).reset_index(drop=True)
+
+    def detect(self, transactions_df):
+        return self.classify(self.summarize(transactions_df))
+
+    def rebuild(self, user_id, on_saved=None):
+        state = self.summarize(self.db.load_transactions_frame(user_id))
+        self.db.save_recurring_state(user_id, state, replace=True, on_saved=on_saved)
+        return state
+
+    def update(self, user_id, new_transactions_df, on_saved=None):
+        # Folding rows in is not idempotent; on_saved lets callers mark them done in the same transaction
+        state = self.db.get_recurring_state(user_id)
+        if state.empty:
+            return self.rebuild(user_id, on_saved)
+
+        # Back-dated uploads would break the running intervals, so rescan those users
+        new_keys = normalize_merchants(new_transactions_df['merchant'])
+        last_seen = new_keys.map(state.set_index('merchant_key')['last_date'])
+        if (pd.to_datetime(new_transactions_df['date']) < pd.to_datetime(last_seen)).any():
+            return self.rebuild(user_id, on_saved)
+
+        state = self.summarize(new_transactions_df, state)
+        self.db.save_recurring_state(user_id, state[state['merchant_key'].isin(new_keys)], on_saved=on_saved)
+        return state
+
+    def get_subscriptions(self, user_id):
+        return self.classify(self.db.get_recurring_state(user_id))
@@ -20,7 +20,7 @@ class RiskAnalyzer:
         expense_ratio = monthly_expenses / monthly_income if monthly_income > 0 else float('inf')
         
         # Calculate category ratios
-        category_totals = transactions_df.groupby('category')['amount'].sum()
+        category_totals = transactions_df.groupby('category', observed=True)['amount'].sum()
         category_ratios = category_totals / monthly_income if monthly_income > 0 else pd.Series(0)
         
         # Risk assessment rules
@@ -86,5 +86,23 @@ class RiskAnalyzer:
                 "Consider investment opportunities",
                 "Review budget monthly"
             ])
+
+        # Forward-looking view from the savings projection, when available
+        projection = risk_analysis.get('projection')
+        if projection:
+            horizon = projection['horizon_months']
+            if projection['depletion_probability'] >= 0.05:
+                recommendations.append(
+                    f"{projection['depletion_probability']:.0%} chance a fully funded emergency fund runs out within {horizon} months at current spending"
+                )
+            # The median counts unreached paths, so it only exists when most paths reach the target
+            if projection['months_to_target_median'] is None or projection['target_probability'] < 0.5:
+                recommendations.append(
+                    f"Emergency fund target is unlikely to be reached within {horizon} months - increase monthly savings"
+                )
+            elif projection['months_to_target_median'] > 0:
+                recommendations.append(
+                    f"Expected to reach emergency fund target in about {projection['months_to_target_median']:.0f} months"
+                )
         
         return recommendations 
\ No newline at end of file
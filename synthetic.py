@@ -0,0 +1,61 @@
+import pandas as pd
+import numpy as np
+
+# merchant -> (category, median amount, spread of log-amount, relative frequency)
+MERCHANTS = {
+    'Whole Foods Market': ('Food', 60.0, 0.4, 8),
+    'Starbucks': ('Food', 6.0, 0.3, 12),
+    'Local Restaurant': ('Food', 35.0, 0.5, 5),
+    'Uber': ('Travel', 18.0, 0.5, 6),
+    'Delta Flight': ('Travel', 320.0, 0.3, 0.3),
+    'Amazon': ('Shopping', 45.0, 0.8, 6),
+    'Target Store': ('Shopping', 55.0, 0.6, 3),
+    'Electric Company': ('Bills', 90.0, 0.2, 1),
+    'Internet Provider': ('Bills', 60.0, 0.05, 1),
+    'Netflix': ('Entertainment', 15.99, 0.0, 1),
+    'Spotify': ('Entertainment', 9.99, 0.0, 1),
+    'Movie Theater': ('Entertainment', 25.0, 0.3, 1.5),
+    'CVS Pharmacy': ('Healthcare', 22.0, 0.6, 1.5),
+    'University Bookstore': ('Education', 40.0, 0.5, 0.5),
+    'Shell Gas Station': ('Transportation', 45.0, 0.3, 4),
+    'Metro Card': ('Transportation', 30.0, 0.1, 1)
+}
+
+
+def _letters(i):
+    # Merchant normalization drops digits, so one-off merchants are told apart by letters
+    suffix = ''
+    while True:
+        i, digit = divmod(i, 26)
+        suffix = chr(ord('A') + digit) + suffix
+        if i == 0:
+            return suffix
+        i -= 1
+
+
+def generate_transactions(n_rows=1000, start_date='2023-01-01', n_days=365, anomaly_rate=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    names = list(MERCHANTS)
+    categories, medians, spreads, weights = (np.array(values) for values in zip(*MERCHANTS.values()))
+
+    picks = rng.choice(len(names), size=n_rows, p=weights / weights.sum())
+    amounts = medians[picks] * np.exp(spreads[picks] * rng.standard_normal(n_rows))
+    offsets = np.sort(rng.integers(0, n_days, size=n_rows))
+    merchants = np.array(names, dtype=object)[picks]
+
+    # Inject anomalies: either a large multiple of the usual amount or a one-off merchant
+    is_anomaly = rng.random(n_rows) < anomaly_rate
+    is_anomaly[:min(n_rows, 50)] = False  # leave a warm-up history clean
+    spikes = is_anomaly & (rng.random(n_rows) < 0.5)
+    amounts[spikes] *= rng.uniform(6, 12, size=spikes.sum())
+    strangers = is_anomaly & ~spikes
+    merchants[strangers] = [f'Unknown Merchant {_letters(i)}' for i in range(strangers.sum())]
+    amounts[strangers] = medians[picks[strangers]] * rng.uniform(4, 8, size=strangers.sum())
+
+    return pd.DataFrame({
+        'date': (pd.Timestamp(start_date) + pd.to_timedelta(offsets, unit='D')).strftime('%Y-%m-%d'),
+        'amount': amounts.round(2),
+        'merchant': merchants,
+        'category': categories[picks],
+        'is_anomaly': is_anomaly
+    })
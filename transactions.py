@@ -1,25 +1,20 @@
 import pandas as pd
-import re
 import plotly.express as px
 from langchain.prompts import PromptTemplate
 from langchain.llms import HuggingFaceHub
 from langchain.chains import LLMChain
 import os
 
+from categories import CategoryRules, compile_patterns, match_category
+from merchants import normalize_merchants
+
 class TransactionClassifier:
     def __init__(self, db):
         self.db = db
-        self.category_patterns = {
-            'Food': r'(restaurant|cafe|food|grocery|supermarket|dining)',
-            'Travel': r'(uber|lyft|taxi|flight|hotel|airbnb|travel)',
-            'Shopping': r'(amazon|walmart|target|shop|store|mall)',
-            'Bills': r'(electric|water|gas|internet|phone|utility)',
-            'Entertainment': r'(netflix|spotify|hulu|movie|theater)',
-            'Healthcare': r'(pharmacy|doctor|hospital|medical)',
-            'Education': r'(school|university|course|book|education)',
-            'Transportation': r'(gas|fuel|car|bus|train|metro)',
-            'Other': r'.*'
-        }
+        # Category patterns are versioned in the database; see categories.py
+        self.rules = CategoryRules(db)
+        self.rule_version, self.category_patterns = self.rules.active()
+        self.compiled_patterns = compile_patterns(self.category_patterns)
         
 
         self.llm = HuggingFaceHub(
@@ -38,9 +33,9 @@ class TransactionClassifier:
 
     def classify_transaction(self, merchant):
         # Try regex patterns first
-        for category, pattern in self.category_patterns.items():
-            if re.search(pattern, merchant.lower()):
-                return category
+        category = match_category(merchant, self.compiled_patterns)
+        if category is not None:
+            return category
         
         # If no match, use LLM
         try:
@@ -58,15 +53,39 @@ class TransactionClassifier:
         if not all(col in transactions_df.columns for col in required_columns):
             raise ValueError("CSV must contain 'date', 'amount', and 'merchant' columns")
 
+        # Store dates as ISO strings whatever format the bank exported
+        dates = pd.to_datetime(transactions_df['date'], format='mixed', errors='coerce')
+        if dates.isna().any():
+            bad_dates = transactions_df.loc[dates.isna(), 'date'].astype(str).unique()[:3]
+            raise ValueError(f"Could not parse dates: {', '.join(bad_dates)}")
+        transactions_df['date'] = dates.dt.strftime('%Y-%m-%d')
+
+        # Pick up rule edits made since this classifier was created
+        self.rule_version, self.category_patterns = self.rules.active()
+        self.compiled_patterns = compile_patterns(self.category_patterns)
+
+        # Classify each distinct merchant once, reusing categories already indexed under these rules
+        transactions_df['merchant_key'] = normalize_merchants(transactions_df['merchant'])
+        rule_texts = transactions_df['merchant'].astype(str).str.lower()
+        raw_merchants = dict(zip(rule_texts, transactions_df['merchant'].astype(str)))
+        categories = self.rules.lookup(raw_merchants, self.rule_version)
+        new_categories = {
+            text: self.classify_transaction(merchant)
+            for text, merchant in raw_merchants.items()
+            if text not in categories
+        }
+        self.rules.record(new_categories, self.rule_version)
+        categories.update(new_categories)
+
         # Add category column
-        transactions_df['category'] = transactions_df['merchant'].apply(self.classify_transaction)
+        transactions_df['category'] = rule_texts.map(categories)
         return transactions_df
 
     def plot_spending_breakdown(self, transactions_df):
         if transactions_df.empty:
             return None
 
-        category_totals = transactions_df.groupby('category')['amount'].sum().reset_index()
+        category_totals = transactions_df.groupby('category', observed=True)['amount'].sum().reset_index()
         fig = px.bar(
             category_totals,
             x='category',
@@ -80,7 +99,7 @@ class TransactionClassifier:
         if transactions_df.empty:
             return pd.DataFrame()
 
-        summary = transactions_df.groupby('category').agg({
+        summary = transactions_df.groupby('category', observed=True).agg({
             'amount': ['sum', 'count', 'mean']
         }).round(2)
         
@@ -0,0 +1,224 @@
+from dotenv import load_dotenv
+load_dotenv()
+
+import argparse
+import json
+import threading
+import time
+import urllib.request
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from database import Database
+from payloads import frame_from_json, frame_to_json
+
+# Per-process components, built once by the pool initializer
+_components = {}
+
+
+def _init_process(db_name):
+    _components['db'] = Database(db_name)
+
+
+def _component(name):
+    # Analyzers are created lazily so a pool that never classifies never loads the LLM
+    if name not in _components:
+        db = _components['db']
+        if name == 'classifier':
+            from transactions import TransactionClassifier
+            _components[name] = TransactionClassifier(db)
+        elif name == 'risk':
+            from risk import RiskAnalyzer
+            _components[name] = RiskAnalyzer(db)
+        elif name == 'projector':
+            from projection import SavingsProjector
+            _components[name] = SavingsProjector(db)
+        elif name == 'portfolio':
+            from portfolio import PortfolioAnalyzer
+            _components[name] = PortfolioAnalyzer(db)
+    return _components[name]
+
+
+def run_classify(payload):
+    transactions_df = frame_from_json(payload['transactions'])
+    return frame_to_json(_component('classifier').process_transactions(transactions_df))
+
+
+def run_risk(payload):
+    db = _components['db']
+    transactions_df = db.load_transactions_frame(payload['user_id'])
+    risk_analysis = _component('risk').calculate_risk_level(payload['monthly_income'], transactions_df)
+    risk_analysis['projection'] = _component('projector').project(
+        payload['monthly_income'],
+        transactions_df,
+        risk_analysis['savings_buffer'],
+        seed_key=payload['user_id']
+    )
+    return risk_analysis
+
+
+def run_portfolio(payload):
+    portfolio_df = _components['db'].get_user_portfolio(payload['user_id'])
+    return frame_to_json(_component('portfolio').calculate_portfolio_value(portfolio_df))
+
+
+JOBS = {
+    'classify': run_classify,
+    'risk': run_risk,
+    'portfolio': run_portfolio
+}
+
+
+class WorkerService:
+    def __init__(self, db_name="financial_copilot.db", processes=None, max_results=1000):
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes,
+            initializer=_init_process,
+            initargs=(db_name,)
+        )
+        self.max_results = max_results
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, kind, payload):
+        if kind not in JOBS:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        job_id = uuid.uuid4().hex
+        future = self.executor.submit(JOBS[kind], payload)
+        with self.lock:
+            self.jobs[job_id] = future
+            # Forget the oldest finished jobs once the result table is full
+            while len(self.jobs) > self.max_results:
+                oldest_id, oldest = next(iter(self.jobs.items()))
+                if not oldest.done():
+                    break
+                del self.jobs[oldest_id]
+        return job_id
+
+    def status(self, job_id):
+        with self.lock:
+            future = self.jobs.get(job_id)
+        if future is None:
+            return None
+        if future.running():
+            return {'status': 'running'}
+        if not future.done():
+            return {'status': 'pending'}
+        error = future.exception()
+        if error is not None:
+            return {'status': 'failed', 'error': str(error)}
+        return {'status': 'done', 'result': future.result()}
+
+    def shutdown(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+class WorkerRequestHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def send_json(self, code, body):
+        data = json.dumps(body, default=float).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if self.path != '/jobs':
+            return self.send_json(404, {'error': 'not found'})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            job_id = self.service.submit(body['kind'], body.get('payload', {}))
+        except (ValueError, KeyError) as e:
+            return self.send_json(400, {'error': str(e)})
+        self.send_json(202, {'job_id': job_id})
+
+    def do_GET(self):
+        if self.path == '/health':
+            return self.send_json(200, {'status': 'ok'})
+        if not self.path.startswith('/jobs/'):
+            return self.send_json(404, {'error': 'not found'})
+        status = self.service.status(self.path[len('/jobs/'):])
+        if status is None:
+            return self.send_json(404, {'error': 'unknown job'})
+        self.send_json(200, status)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WorkerClient:
+    def __init__(self, url, poll_interval=0.2, timeout=300):
+        self.url = url.rstrip('/')
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    def _request(self, path, body=None):
+        data = json.dumps(body, default=float).encode() if body is not None else None
+        request = urllib.request.Request(
+            self.url + path,
+            data=data,
+            headers={'Content-Type': 'application/json'}
+        )
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.loads(response.read())
+
+    def submit(self, kind, payload):
+        return self._request('/jobs', {'kind': kind, 'payload': payload})['job_id']
+
+    def status(self, job_id):
+        return self._request(f'/jobs/{job_id}')
+
+    def wait(self, job_id):
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            status = self.status(job_id)
+            if status['status'] == 'done':
+                return status['result']
+            if status['status'] == 'failed':
+                raise RuntimeError(status['error'])
+            time.sleep(self.poll_interval)
+        raise TimeoutError(f"Job {job_id} did not finish within {self.timeout} seconds")
+
+    def run(self, kind, payload):
+        return self.wait(self.submit(kind, payload))
+
+    def process_transactions(self, transactions_df):
+        return frame_from_json(self.run('classify', {'transactions': frame_to_json(transactions_df)}))
+
+    def calculate_risk(self, user_id, monthly_income):
+        return self.run('risk', {'user_id': user_id, 'monthly_income': monthly_income})
+
+    def calculate_portfolio_value(self, user_id):
+        return frame_from_json(self.run('portfolio', {'user_id': user_id}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless compute worker for Financial Copilot")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--db', default='financial_copilot.db')
+    args = parser.parse_args()
+
+    # Create the schema and switch the store to WAL before any worker connects
+    Database(args.db)
+    service = WorkerService(args.db, args.processes)
+    WorkerRequestHandler.service = service
+    server = ThreadingHTTPServer((args.host, args.port), WorkerRequestHandler)
+    print(f"Worker listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == '__main__':
+    main()